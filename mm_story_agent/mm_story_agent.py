@@ -1,25 +1,76 @@
 import time
-import json
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 import torch.multiprocessing as mp
-mp.set_start_method("spawn", force=True)
 
-from .base import init_tool_instance
+from .base import init_tool_instance, TOOL_REGISTRY
+from .utils.json_utils import json_dumps, json_dumps_bytes
+
+
+# 只等待远程 API 的模态（is_io_bound = True）在线程中运行，无需 spawn 子进程
+_io_executor = ThreadPoolExecutor(max_workers=4)
+
+
+# 每个进程内按 tool/cfg 缓存已初始化的模态智能体，模型等重量级状态只构造一次
+_worker_agents = {}
+
+
+def agent_cache_key(agent_cfg):
+    return json_dumps({"tool": agent_cfg["tool"], "cfg": agent_cfg["cfg"]})
+
+
+def call_modality_agent(agent_cfg, params):
+    # 智能体在子进程内构造，父进程只需传递体积很小的 cfg，不必 pickle 整个智能体
+    key = agent_cache_key(agent_cfg)
+    if key not in _worker_agents:
+        _worker_agents[key] = init_tool_instance(agent_cfg)
+    return _worker_agents[key].call(params)
 
 
 class MMStoryAgent:
 
     def __init__(self) -> None:
         self.modalities = ["image",  "speech"]
+        self._executor = None
+        self._agents = {}
+
+    def __enter__(self):
+        self._get_executor()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
-    def call_modality_agent(self, modality, agent, params, return_dict):
-        result = agent.call(params)
-        return_dict[modality] = result
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        # 释放缓存智能体持有的资源（如故事生成器的章节线程池）
+        for agent in self._agents.values():
+            if hasattr(agent, "close"):
+                agent.close()
+        self._agents.clear()
+
+    def _get_executor(self):
+        # 进程池只在首次使用时创建，之后在多次调用间复用，避免每次重新 spawn
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=len(self.modalities),
+                mp_context=mp.get_context("spawn")
+            )
+        return self._executor
+
+    def _get_agent(self, agent_cfg):
+        # 相同 tool/cfg 的智能体（故事生成器、模态智能体）在多个故事间复用，避免重复初始化
+        key = agent_cache_key(agent_cfg)
+        if key not in self._agents:
+            self._agents[key] = init_tool_instance(agent_cfg)
+        return self._agents[key]
 
     def write_story(self, config):
         cfg = config["story_writer"]
-        story_writer = init_tool_instance(cfg)
+        story_writer = self._get_agent(cfg)
         pages = story_writer.call(cfg["params"])
         return pages
     
@@ -30,14 +81,17 @@ class MMStoryAgent:
         for sub_dir in self.modalities:
             (story_dir / sub_dir).mkdir(exist_ok=True, parents=True)
 
-        agents = {}
+        agent_cfgs = {}
         params = {}
         enabled_modalities = []  # 添加：跟踪启用的模态
         
         # 添加：检查每个模态是否启用
         for modality in self.modalities:
             if config.get(f"enable_{modality}", True):  # 默认启用
-                agents[modality] = init_tool_instance(config[modality + "_generation"])
+                agent_cfgs[modality] = {
+                    "tool": config[modality + "_generation"]["tool"],
+                    "cfg": config[modality + "_generation"]["cfg"]
+                }
                 params[modality] = config[modality + "_generation"]["params"].copy()
                 params[modality].update({
                     "pages": pages,
@@ -47,24 +101,23 @@ class MMStoryAgent:
             else:
                 print(f"⏭️ 跳过{modality}生成")
 
-        processes = []
-        return_dict = mp.Manager().dict()
-
         # 修改：只处理启用的模态
+        futures = {}
         for modality in enabled_modalities:
-            p = mp.Process(
-                target=self.call_modality_agent,
-                args=(
-                    modality,
-                    agents[modality],
-                    params[modality],
-                    return_dict)
-                )
-            processes.append(p)
-            p.start()
-        
-        for p in processes:
-            p.join()
+            agent_cfg = agent_cfgs[modality]
+            if getattr(TOOL_REGISTRY[agent_cfg["tool"]], "is_io_bound", False):
+                agent = self._get_agent(agent_cfg)
+                futures[modality] = _io_executor.submit(agent.call, params[modality])
+            else:
+                futures[modality] = self._get_executor().submit(
+                    call_modality_agent, agent_cfg, params[modality])
+
+        return_dict = {}
+        for modality, future in futures.items():
+            try:
+                return_dict[modality] = future.result()
+            except Exception as e:
+                print(f"❌ {modality} 生成失败: {e}")
 
         images = []
         for modality, result in return_dict.items():
@@ -76,8 +129,7 @@ class MMStoryAgent:
             except Exception as e:
                 print(f"Error occurred during generation: {e}")
         
-        with open(story_dir / "script_data.json", "w") as writer:
-            json.dump(script_data, writer, ensure_ascii=False, indent=4)
+        (story_dir / "script_data.json").write_bytes(json_dumps_bytes(script_data, indent=True))
         
         return images
     
@@ -101,4 +153,9 @@ class MMStoryAgent:
             pages = ["默认故事页面1", "默认故事页面2", "默认故事页面3"]
             
         images = self.generate_modality_assets(config, pages)
-        self.compose_storytelling_video(config, pages)
\ No newline at end of file
+        self.compose_storytelling_video(config, pages)
+
+    def call_batch(self, configs):
+        # 批量生成多个故事，进程池和已初始化的模态智能体在故事之间保持复用
+        for config in configs:
+            self.call(config)
\ No newline at end of file
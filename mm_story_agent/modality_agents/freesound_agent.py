@@ -2,7 +2,6 @@ from typing import List
 import os
 import shutil
 from pathlib import Path
-import json
 import urllib.parse
 import requests
 
@@ -14,6 +13,7 @@ from tqdm import tqdm
 from ..prompts_en import fsd_search_reviser_system, fsd_search_reviewer_system, fsd_music_reviser_system, fsd_music_reviewer_system
 from ..base import register_tool, init_tool_instance
 from ..utils.llm_output_check import parse_list
+from ..utils.json_utils import json_dumps
 
 
 def download_file(url, save_path):
@@ -100,17 +100,17 @@ class FreesoundSfxAgent:
             query_list = ""
             for turn in range(num_turns):
                 query_list, success = query_reviser.call(
-                    json.dumps({
+                    json_dumps({
                         "story": page,
                         "previous_result": query_list,
                         "improvement_suggestions": review,
-                    }, ensure_ascii=False),
+                    }),
                     success_check_fn=parse_list
                 )
-                review, success = query_reviewer.call(json.dumps({
+                review, success = query_reviewer.call(json_dumps({
                     "story": page,
                     "sound_description": query_list
-                }, ensure_ascii=False))
+                }))
                 if review == "Check passed.":
                     break
                 else:
@@ -164,16 +164,16 @@ class FreesoundMusicAgent:
 
         for turn in range(num_turns):
             query, success = query_reviser.call(
-                json.dumps({
+                json_dumps({
                     "story": pages,
                     "previous_result": query,
                     "improvement_suggestions": review,
-                }, ensure_ascii=False)
+                })
             )
-            review, success = query_reviewer.call(json.dumps({
+            review, success = query_reviewer.call(json_dumps({
                 "story": pages,
                 "music_query": query
-            }, ensure_ascii=False))
+            }))
             if review == "Check passed.":
                 break
             else:
@@ -18,6 +18,7 @@ from diffusers import StableDiffusionXLPipeline, DDIMScheduler
 from mm_story_agent.prompts_en import role_extract_system, role_review_system, \
     story_to_image_reviser_system, story_to_image_review_system
 from mm_story_agent.base import register_tool, init_tool_instance
+from mm_story_agent.utils.json_utils import json_dumps
 
 
 # def setup_seed(seed):
@@ -659,6 +660,8 @@ class DashScopeImageGenerator:
 @register_tool("story_diffusion_t2i")
 class StoryDiffusionAgent:
 
+    is_io_bound = True
+
     def __init__(self, cfg) -> None:
         self.cfg = cfg
         
@@ -720,17 +723,16 @@ class StoryDiffusionAgent:
         roles = {}
         review = ""
         for turn in range(num_turns):
-            roles, success = role_extractor.call(json.dumps({
+            roles, success = role_extractor.call(json_dumps({
                     "story_content": pages,
                     "previous_result": roles,
                     "improvement_suggestions": review,
-                }, ensure_ascii=False
-            ))
+                }))
             roles = json.loads(roles.strip("```json").strip("```"))
-            review, success = role_reviewer.call(json.dumps({
+            review, success = role_reviewer.call(json_dumps({
                 "story_content": pages,
                 "role_descriptions": roles
-            }, ensure_ascii=False))
+            }))
             if review == "Check passed.":
                 break
         return roles
@@ -757,19 +759,19 @@ class StoryDiffusionAgent:
             review = ""
             image_prompt = ""
             for turn in range(num_turns):
-                image_prompt, success = image_prompt_reviser.call(json.dumps({
+                image_prompt, success = image_prompt_reviser.call(json_dumps({
                     "all_pages": pages,
                     "current_page": page,
                     "previous_result": image_prompt,
                     "improvement_suggestions": review,
-                }, ensure_ascii=False))
+                }))
                 if image_prompt.startswith("Image description:"):
                     image_prompt = image_prompt[len("Image description:"):]
-                review, success = image_prompt_reviewer.call(json.dumps({
+                review, success = image_prompt_reviewer.call(json_dumps({
                     "all_pages": pages,
                     "current_page": page,
                     "image_description": image_prompt
-                }, ensure_ascii=False))
+                }))
                 if review == "Check passed.":
                     break
             image_prompts.append(image_prompt)
@@ -45,34 +45,36 @@ class QwenAgent(object):
         })
         success = False
         try_times = 0
-        while try_times < max_try:
-            response = Generation.call(
-                model=model_name,
-                messages=self.history,
-                top_p=top_p,
-                temperature=temperature,
-                api_key=os.environ.get('DASHSCOPE_API_KEY'),
-                seed=seed,
-                max_length=max_length
-            )
-            if success_check_fn is None:
-                success_check_fn = lambda x: True
-            if self.basic_success_check(response) and success_check_fn(response.output.text):
-                response = response.output.text
-                self.history.append({
-                    "role": "assistant",
-                    "content": response
-                })
-                success = True
-                break
-            else:
-                try_times += 1
-        
-        if not self.track_history:
-            if self.system_prompt is not None:
-                self.history = self.history[:1]
-            else:
-                self.history = []
+        try:
+            while try_times < max_try:
+                response = Generation.call(
+                    model=model_name,
+                    messages=self.history,
+                    top_p=top_p,
+                    temperature=temperature,
+                    api_key=os.environ.get('DASHSCOPE_API_KEY'),
+                    seed=seed,
+                    max_length=max_length
+                )
+                if success_check_fn is None:
+                    success_check_fn = lambda x: True
+                if self.basic_success_check(response) and success_check_fn(response.output.text):
+                    response = response.output.text
+                    self.history.append({
+                        "role": "assistant",
+                        "content": response
+                    })
+                    success = True
+                    break
+                else:
+                    try_times += 1
+        finally:
+            # 即使 Generation.call 抛出异常也要重置历史，避免被复用的实例携带残留的对话
+            if not self.track_history:
+                if self.system_prompt is not None:
+                    self.history = self.history[:1]
+                else:
+                    self.history = []
         
         return response, success
    
\ No newline at end of file
@@ -1,5 +1,4 @@
 from pathlib import Path
-import json
 from typing import List, Union, Dict
 
 import soundfile as sf
@@ -8,6 +7,7 @@ from transformers import AutoProcessor, MusicgenForConditionalGeneration
 
 from mm_story_agent.prompts_en import story_to_music_reviser_system, story_to_music_reviewer_system
 from mm_story_agent.base import register_tool, init_tool_instance
+from mm_story_agent.utils.json_utils import json_dumps
 
 
 class MusicGenSynthesizer:
@@ -66,15 +66,15 @@ class MusicGenAgent:
         music_prompt = ""
         review = ""
         for turn in range(self.cfg.get("max_turns", 3)):
-            music_prompt, success = music_prompt_reviser.call(json.dumps({
+            music_prompt, success = music_prompt_reviser.call(json_dumps({
                 "story": pages,
                 "previous_result": music_prompt,
                 "improvement_suggestions": review,
-            }, ensure_ascii=False))
-            review, success = music_prompt_reviewer.call(json.dumps({
+            }))
+            review, success = music_prompt_reviewer.call(json_dumps({
                 "story_content": pages,
                 "music_description": music_prompt
-            }, ensure_ascii=False))
+            }))
             if review == "Check passed.":
                 break
         
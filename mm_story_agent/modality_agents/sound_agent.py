@@ -1,6 +1,5 @@
 from pathlib import Path
 from typing import List, Dict
-import json
 
 import torch
 import soundfile as sf
@@ -8,6 +7,7 @@ from diffusers import AudioLDM2Pipeline
 
 from mm_story_agent.prompts_en import story_to_sound_reviser_system, story_to_sound_review_system
 from mm_story_agent.base import register_tool, init_tool_instance
+from mm_story_agent.utils.json_utils import json_dumps
 
 
 class AudioLDM2Synthesizer:
@@ -101,17 +101,17 @@ class AudioLDM2Agent:
             review = ""
             sound_prompt = ""
             for turn in range(num_turns):
-                sound_prompt, success = sound_prompt_reviser.call(json.dumps({
+                sound_prompt, success = sound_prompt_reviser.call(json_dumps({
                     "story": page,
                     "previous_result": sound_prompt,
                     "improvement_suggestions": review,
-                }, ensure_ascii=False))
+                }))
                 if sound_prompt.startswith("Sound description:"):
                     sound_prompt = sound_prompt[len("Sound description:"):]
-                review, success = sound_prompt_reviewer.call(json.dumps({
+                review, success = sound_prompt_reviewer.call(json_dumps({
                     "story": page,
                     "sound_description": sound_prompt
-                }, ensure_ascii=False))
+                }))
                 if review == "Check passed.":
                     break
                 # else:
@@ -1,19 +1,46 @@
 import os
 import json
+import logging
 from pathlib import Path
 from typing import List, Dict
+import threading
 import time
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 
 from aliyunsdkcore.client import AcsClient
 from aliyunsdkcore.request import CommonRequest
 import nls
 
 from mm_story_agent.base import register_tool
+from mm_story_agent.utils.retry_utils import backoff_sleep
+
+
+logger = logging.getLogger(__name__)
+
+# 普通语音合成支持的发音人
+_SUPPORTED_VOICES = frozenset({"xiaoyun", "xiaogang", "xiaowei", "xiaoxiao"})
 
 
 class StandardTTSSynthesizer:
     """使用阿里云普通语音合成服务（非CosyVoice大模型）"""
 
+    # 使用普通语音合成的端点
+    endpoints = (
+        "wss://nls-gateway-cn-shanghai.aliyuncs.com/ws/v1",
+        "wss://nls-gateway-cn-beijing.aliyuncs.com/ws/v1",
+        "wss://nls-gateway-cn-hangzhou.aliyuncs.com/ws/v1"
+    )
+    # 最近一次合成成功的端点，同一进程内的后续请求优先尝试
+    _best_endpoint = None
+    # 熔断：端点连续失败达到阈值后被移到列表末尾，仅作为最后的备选；
+    # 冷却时间过后放行一次试探请求，成功即恢复，失败则重新计时
+    _endpoint_failures = {}
+    _endpoint_tripped_at = {}
+    _endpoint_lock = threading.Lock()
+    max_consecutive_failures = 3
+    breaker_cooldown = 30.0
+
     def __init__(self, cfg=None) -> None:
         # 直接从环境变量获取Token和AppKey
         self.token = os.environ.get('ALIYUN_ACCESS_TOKEN')
@@ -22,19 +49,21 @@ class StandardTTSSynthesizer:
         self.sample_rate = cfg.get("sample_rate", 16000) if cfg else 16000
         
         # 验证必要的凭据
-        self._validate_credentials()
+        self._validate_credentials(self.token, self.app_key)
         
         print(f"✅ 使用普通语音合成服务")
         print(f"✅ 使用Token: {self.token[:10]}...")
         print(f"✅ 使用AppKey: {self.app_key}")
         print(f"✅ 使用地域: {self.region}")
 
-    def _validate_credentials(self):
-        """验证凭据是否完整"""
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _validate_credentials(token, app_key):
+        """验证凭据是否完整，相同凭据在进程内只校验一次"""
         missing = []
-        if not self.token:
+        if not token:
             missing.append("ALIYUN_ACCESS_TOKEN")
-        if not self.app_key:
+        if not app_key:
             missing.append("ALIYUN_APP_KEY")
         
         if missing:
@@ -43,6 +72,40 @@ class StandardTTSSynthesizer:
                 f"Please set these environment variables."
             )
 
+    def _ordered_endpoints(self):
+        """按优先级排列端点：上次成功的端点优先，熔断中的端点排在最后"""
+        best_endpoint = StandardTTSSynthesizer._best_endpoint
+        endpoints = list(self.endpoints)
+        if best_endpoint is not None:
+            endpoints.remove(best_endpoint)
+            endpoints.insert(0, best_endpoint)
+        
+        available, tripped = [], []
+        now = time.monotonic()
+        with self._endpoint_lock:
+            for endpoint in endpoints:
+                tripped_at = self._endpoint_tripped_at.get(endpoint)
+                if tripped_at is None:
+                    available.append(endpoint)
+                elif now - tripped_at >= self.breaker_cooldown:
+                    # 冷却结束，放行本次试探；重新计时，避免并发请求同时试探
+                    self._endpoint_tripped_at[endpoint] = now
+                    available.append(endpoint)
+                else:
+                    tripped.append(endpoint)
+        return available + tripped
+
+    def _record_endpoint_result(self, endpoint, success):
+        with self._endpoint_lock:
+            if success:
+                self._endpoint_failures.pop(endpoint, None)
+                self._endpoint_tripped_at.pop(endpoint, None)
+                return
+            failures = self._endpoint_failures.get(endpoint, 0) + 1
+            self._endpoint_failures[endpoint] = failures
+            if failures >= self.max_consecutive_failures:
+                self._endpoint_tripped_at[endpoint] = time.monotonic()
+
     def call(self, save_file, transcript, voice="xiaoyun", sample_rate=16000):
         """调用普通语音合成API（非CosyVoice）"""
         try:
@@ -51,100 +114,119 @@ class StandardTTSSynthesizer:
                 print(f"⚠️  跳过空文本的语音合成: {save_file}")
                 return  # 直接返回，不进行合成
             
-            # 确保保存目录存在
+            # 保存目录由调用方（CosyVoiceAgent.call）统一创建
             save_path = Path(save_file)
-            save_path.parent.mkdir(parents=True, exist_ok=True)
             
             # 确保文件扩展名为.mp3
             if not save_path.name.endswith('.mp3'):
                 save_path = save_path.parent / (save_path.stem + '.mp3')
             
-            writer = open(save_path, "wb")
-            return_data = b''
-            is_completed = False
-
-            def on_data(data, *args):
-                nonlocal return_data
-                return_data += data
-                if writer is not None:
-                    writer.write(data)
-
-            def on_completed(*args):
-                nonlocal is_completed
-                is_completed = True
-                print("✅ 语音合成完成")
-
-            def on_error(error, *args):
-                raise RuntimeError(f'Synthesizing speech failed with error: {error}')
-
-            def on_close(*args):
-                if writer is not None:
-                    writer.close()
-
-            # 使用普通语音合成的端点
-            endpoints = [
-                "wss://nls-gateway-cn-shanghai.aliyuncs.com/ws/v1",
-                "wss://nls-gateway-cn-beijing.aliyuncs.com/ws/v1",
-                "wss://nls-gateway-cn-hangzhou.aliyuncs.com/ws/v1"
-            ]
+            # SDK 每次回调只给出很小的数据块，使用 64KB 缓冲合并写入；with 保证出错时文件也会被关闭
+            with open(save_path, "wb", buffering=1 << 16) as writer:
+                write_lock = threading.Lock()
+
+                def make_callbacks(done, completed, retired):
+                    # 每次尝试使用独立的事件；尝试结束后 retired 被置位，
+                    # 被放弃连接的迟到回调既不会写入文件，也不会唤醒后续尝试
+                    def on_data(data, *args):
+                        with write_lock:
+                            if not retired.is_set():
+                                writer.write(data)
+
+                    def on_completed(*args):
+                        if not retired.is_set():
+                            completed.set()
+                            done.set()
+                            print("✅ 语音合成完成")
+
+                    def on_error(error, *args):
+                        if not retired.is_set():
+                            done.set()
+                        raise RuntimeError(f'Synthesizing speech failed with error: {error}')
+
+                    def on_close(*args):
+                        if not retired.is_set():
+                            done.set()
+
+                    return on_data, on_completed, on_error, on_close
+
+                # 优先尝试上次成功的端点，失败后再依次尝试其余端点
+                endpoints = self._ordered_endpoints()
             
-            success = False
-            last_error = None
+                success = False
+                last_error = None
             
-            for endpoint in endpoints:
-                try:
-                    print(f"🔧 尝试端点: {endpoint}")
-                    print(f"🔊 使用发音人: {voice}")
-                    print(f"🔊 生成语音: {transcript[:50]}...")
-                    
-                    # 使用NlsSpeechSynthesizer（普通语音合成）
-                    sdk = nls.NlsSpeechSynthesizer(
-                        url=endpoint,
-                        token=self.token,
-                        appkey=self.app_key,
-                        on_data=on_data,
-                        on_completed=on_completed,
-                        on_error=on_error,
-                        on_close=on_close,
-                    )
-
-                    # 开始语音合成 - 使用正确的参数名 aformat
-                    sdk.start(text=transcript, 
-                             voice=voice, 
-                             aformat='mp3',  # 改为 aformat
-                             sample_rate=sample_rate,
-                             volume=50,
-                             speech_rate=0,
-                             pitch_rate=0)
+                for attempt, endpoint in enumerate(endpoints):
+                    if attempt > 0:
+                        # 切换端点前指数退避
+                        backoff_sleep(attempt - 1)
+                    done = threading.Event()
+                    # 只有 on_completed 会置位 completed；on_error / on_close 只负责唤醒等待
+                    completed = threading.Event()
+                    retired = threading.Event()
+                    on_data, on_completed, on_error, on_close = make_callbacks(done, completed, retired)
+                    try:
+                        print(f"🔧 尝试端点: {endpoint}")
+                        print(f"🔊 使用发音人: {voice}")
+                        print(f"🔊 生成语音: {transcript[:50]}...")
                     
-                    # 等待合成完成（最多30秒）
-                    start_time = time.time()
-                    while not is_completed and time.time() - start_time < 30:
-                        time.sleep(0.1)
+                        # 使用NlsSpeechSynthesizer（普通语音合成）
+                        sdk = nls.NlsSpeechSynthesizer(
+                            url=endpoint,
+                            token=self.token,
+                            appkey=self.app_key,
+                            on_data=on_data,
+                            on_completed=on_completed,
+                            on_error=on_error,
+                            on_close=on_close,
+                        )
+
+                        # 开始语音合成 - 使用正确的参数名 aformat
+                        sdk.start(text=transcript, 
+                                 voice=voice, 
+                                 aformat='mp3',  # 改为 aformat
+                                 sample_rate=sample_rate,
+                                 volume=50,
+                                 speech_rate=0,
+                                 pitch_rate=0)
                     
-                    if not is_completed:
-                        print(f"⚠️  语音合成超时: {save_path}")
-                        # 尝试关闭连接
-                        try:
-                            sdk.shutdown()
-                        except:
-                            pass
+                        # 等待合成完成（最多30秒）
+                        timed_out = not done.wait(timeout=30)
+                        if timed_out:
+                            print(f"⚠️  语音合成超时: {save_path}")
+                            # 尝试关闭连接
+                            try:
+                                sdk.shutdown()
+                            except:
+                                pass
                     
-                    # 检查文件是否成功生成
-                    if save_path.exists() and save_path.stat().st_size > 0:
-                        print(f"✅ 普通语音合成成功: {save_path}")
-                        success = True
-                        break
-                    else:
-                        print(f"❌ 语音文件生成失败: {save_path}")
-                        # 记录失败原因
-                        with open(save_path.parent / "synthesis_errors.log", "a") as log_file:
-                            log_file.write(f"文件: {save_path.name}, 错误: 合成失败或文件为空\n")
+                        # 检查文件是否成功生成：文件仍处于打开状态，直接读取写入位置，无需 stat；
+                        # 超时、出错或连接提前关闭时只写入了部分数据，视为失败
+                        if not timed_out and completed.is_set() and writer.tell() > 0:
+                            print(f"✅ 普通语音合成成功: {save_path}")
+                            StandardTTSSynthesizer._best_endpoint = endpoint
+                            self._record_endpoint_result(endpoint, True)
+                            success = True
+                            with write_lock:
+                                retired.set()
+                            break
+                        else:
+                            print(f"❌ 语音文件生成失败: {save_path}")
+                            # 记录失败原因
+                            logger.warning("文件: %s, 错误: 合成失败或文件为空", save_path.name)
+                            self._record_endpoint_result(endpoint, False)
                         
-                except Exception as e:
-                    last_error = e
-                    print(f"❌ 端点 {endpoint} 失败: {e}")
-                    continue
+                    except Exception as e:
+                        last_error = e
+                        self._record_endpoint_result(endpoint, False)
+                        print(f"❌ 端点 {endpoint} 失败: {e}")
+
+                    # 本次尝试失败：停止接收该连接的数据，并丢弃已写入的部分内容，
+                    # 避免截断的 mp3 在下一次尝试中被误判为成功
+                    with write_lock:
+                        retired.set()
+                        writer.seek(0)
+                        writer.truncate()
             
             if not success:
                 if last_error:
@@ -160,6 +242,8 @@ class StandardTTSSynthesizer:
 @register_tool("cosyvoice_tts")
 class CosyVoiceAgent:
 
+    is_io_bound = True
+
     def __init__(self, cfg) -> None:
         self.cfg = cfg
 
@@ -172,6 +256,12 @@ class CosyVoiceAgent:
         save_path = Path(save_path)
         save_path.mkdir(parents=True, exist_ok=True)
         
+        # 合成失败记录到 synthesis_errors.log，文件只在首次写入时打开，整个调用期间复用
+        error_log_handler = logging.FileHandler(
+            save_path / "synthesis_errors.log", encoding="utf-8", delay=True)
+        error_log_handler.setLevel(logging.WARNING)
+        logger.addHandler(error_log_handler)
+        
         try:
             # 初始化普通语音合成器
             tts_agent = StandardTTSSynthesizer(self.cfg)
@@ -179,26 +269,27 @@ class CosyVoiceAgent:
             print(f"🎯 开始使用普通语音合成服务，共 {len(pages)} 页")
             
             # 使用普通语音合成支持的发音人
-            supported_voices = ["xiaoyun", "xiaogang", "xiaowei", "xiaoxiao"]
             voice = params.get("voice", "xiaoyun")
+            sample_rate = self.cfg.get("sample_rate", 16000)
             
-            if voice not in supported_voices:
+            if voice not in _SUPPORTED_VOICES:
                 print(f"⚠️  发音人 {voice} 可能不支持，使用默认发音人 xiaoyun")
                 voice = "xiaoyun"
             
-            for idx, page in enumerate(pages):
+            def synthesize_page(idx, page):
                 # 检查页面文本是否有效
                 if not page or len(page.strip()) == 0:
                     print(f"⚠️  跳过第 {idx+1} 页，文本内容为空")
-                    continue
+                    return
                 
                 print(f"📝 处理第 {idx+1}/{len(pages)} 页")
-                tts_agent.call(
-                    save_file=save_path / f"p{idx + 1}.mp3",
-                    transcript=page,
-                    voice=voice,
-                    sample_rate=self.cfg.get("sample_rate", 16000)
-                )
+                # save_file, transcript, voice, sample_rate
+                tts_agent.call(save_path / f"p{idx + 1}.mp3", page, voice, sample_rate)
+            
+            # 各页合成主要在等待网络，使用线程池并发发起请求
+            max_workers = max(1, min(self.cfg.get("max_workers", 8), len(pages)))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                list(executor.map(synthesize_page, range(len(pages)), pages))
             
             print("✅ 所有语音文件生成完成（使用普通语音合成服务）")
             return {
@@ -215,4 +306,7 @@ class CosyVoiceAgent:
                 "modality": "speech", 
                 "status": "failed",
                 "error": str(e)
-            }
\ No newline at end of file
+            }
+        finally:
+            logger.removeHandler(error_log_handler)
+            error_log_handler.close()
\ No newline at end of file
@@ -1,11 +1,17 @@
-import os
+import ast
 import json
 from typing import Dict
 import random
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 
 from tqdm import trange, tqdm
 
 from ..utils.llm_output_check import parse_list
+from ..utils.json_utils import json_dumps, json_loads
+from ..utils.io import load_data_content
+from ..utils.retry_utils import backoff_sleep
 from ..base import register_tool, init_tool_instance
 from ..prompts_en import question_asker_system, expert_system, \
     dlg_based_writer_system, dlg_based_writer_prompt, chapter_writer_system
@@ -13,21 +19,25 @@ from ..prompts_en import question_asker_system, expert_system, \
 
 def json_parse_outline(outline):
     outline = outline.strip("```json").strip("```")
+    # 不是 JSON 对象的输出无需解析即可判定失败
+    if not outline.lstrip().startswith("{"):
+        return False
     try:
-        outline = json.loads(outline)
-        if not isinstance(outline, dict):
-            return False
-        if outline.keys() != {"story_title", "story_outline"}:
-            return False
-        for chapter in outline["story_outline"]:
-            if chapter.keys() != {"chapter_title", "chapter_summary"}:
-                return False
-    except json.decoder.JSONDecodeError:
+        outline = json_loads(outline)
+    except ValueError:
         return False
+    if len(outline) != 2 or "story_title" not in outline or "story_outline" not in outline:
+        return False
+    for chapter in outline["story_outline"]:
+        if not isinstance(chapter, dict) or len(chapter) != 2 \
+                or "chapter_title" not in chapter or "chapter_summary" not in chapter:
+            return False
     return True
 
 
 # 数据驱动prompt
+data_analyzer_system = "你是一个数据分析专家。请分析提供的数据内容，提取关键信息和主要趋势。"
+
 data_driven_writer_system = """你是一个专业的数据故事作家。你的任务是根据提供的数据内容直接生成连贯的故事页面。
 数据内容可能包含各种信息，如统计数据、事件描述、用户反馈等。
 请基于这些真实数据创作一个引人入胜的故事，确保故事内容与数据紧密相关，避免添加不必要的主观臆测或虚构内容。
@@ -48,16 +58,37 @@ class QAOutlineStoryWriter:
         self.max_conv_turns = cfg.get("max_conv_turns", 3)
         self.num_outline = cfg.get("num_outline", 4)
         self.llm_type = cfg.get("llm", "qwen")
+        self.max_concurrent_chapters = max(1, cfg.get("max_concurrent_chapters", 4))
+        self._local = threading.local()
+        self._chapter_executor = None
+
+    def _get_client(self, system_prompt):
+        # 按 system prompt 复用 LLM 实例；实例会记录对话历史，因此每个线程各自缓存一份
+        clients = self._local.__dict__.setdefault("clients", {})
+        if system_prompt not in clients:
+            clients[system_prompt] = init_tool_instance({
+                "tool": self.llm_type,
+                "cfg": {
+                    "system_prompt": system_prompt,
+                    "track_history": False
+                }
+            })
+        return clients[system_prompt]
+
+    def _get_chapter_executor(self):
+        # 线程池在多次调用间复用，各工作线程缓存的章节 LLM 实例因此也得以复用
+        if self._chapter_executor is None:
+            self._chapter_executor = ThreadPoolExecutor(max_workers=self.max_concurrent_chapters)
+        return self._chapter_executor
+
+    def close(self):
+        if self._chapter_executor is not None:
+            self._chapter_executor.shutdown()
+            self._chapter_executor = None
 
     def generate_data_summary(self, data_content):
         """从数据内容中提取关键信息并生成数据摘要"""
-        data_analyzer = init_tool_instance({
-            "tool": self.llm_type,
-            "cfg": {
-                "system_prompt": "你是一个数据分析专家。请分析提供的数据内容，提取关键信息和主要趋势。",
-                "track_history": False
-            }
-        })
+        data_analyzer = self._get_client(data_analyzer_system)
         
         analysis_prompt = f"""请分析以下数据内容，提取关键信息并生成一个简洁的数据摘要：
         
@@ -87,13 +118,7 @@ class QAOutlineStoryWriter:
         data_summary = self.generate_data_summary(data_content)
         
         # 使用数据驱动的故事生成器
-        writer = init_tool_instance({
-            "tool": self.llm_type,
-            "cfg": {
-                "system_prompt": data_driven_writer_system,
-                "track_history": False
-            }
-        })
+        writer = self._get_client(data_driven_writer_system)
         
         writer_prompt = f"""基于以下数据内容生成一个故事大纲：
 
@@ -132,96 +157,89 @@ class QAOutlineStoryWriter:
             }
         return outline
 
+    def generate_chapter_pages(self, idx, chapter, data_content_json, completed_json):
+        """基于单个章节大纲生成故事页面"""
+        # 并发生成时每个线程持有各自的 LLM 实例
+        chapter_writer = self._get_client(data_driven_chapter_system)
+        
+        # 同一章节的重试使用相同的输入
+        chapter_prompt = (
+            f'{{"data_content":{data_content_json},'
+            f'"current_chapter":{json_dumps(chapter)},'
+            f'"completed_story":{completed_json}}}'
+        )
+        chapter_detail, success = chapter_writer.call(
+            chapter_prompt,
+            success_check_fn=parse_list,
+            temperature=self.temperature
+        )
+        
+        # 如果生成失败，重试几次
+        retry_count = 0
+        while not success and retry_count < 3:
+            # 指数退避，避免连续重试冲击限流的接口
+            backoff_sleep(retry_count)
+            chapter_detail, success = chapter_writer.call(
+                chapter_prompt,
+                seed=random.randint(0, 100000),
+                temperature=self.temperature,
+                success_check_fn=parse_list
+            )
+            retry_count += 1
+        
+        if success:
+            try:
+                pages = ast.literal_eval(chapter_detail)
+                if isinstance(pages, list):
+                    return [page.strip() for page in pages]
+                # 如果返回的不是列表，创建默认页面
+                return [f"第{idx+1}章: {chapter['chapter_title']}"]
+            except:
+                # 如果解析失败，创建默认页面
+                return [f"第{idx+1}章: {chapter['chapter_title']}"]
+        else:
+            # 如果所有重试都失败，创建默认页面
+            return [
+                f"第{idx+1}章: {chapter['chapter_title']}",
+                f"基于数据的分析内容"
+            ]
+
     def generate_story_from_outline(self, outline, data_content):
         """基于大纲和数据内容生成具体的故事页面"""
-        chapter_writer = init_tool_instance({
-            "tool": self.llm_type,
-            "cfg": {
-                "system_prompt": data_driven_chapter_system,
-                "track_history": False
-            }
-        })
+        chapters = outline["story_outline"]
+        max_concurrent = self.max_concurrent_chapters
         
         all_pages = []
-        for idx, chapter in enumerate(tqdm(outline["story_outline"])):
-            chapter_detail, success = chapter_writer.call(
-                json.dumps(
-                    {
-                        "data_content": data_content,
-                        "current_chapter": chapter,
-                        "completed_story": all_pages
-                    },
-                    ensure_ascii=False
-                ),
-                success_check_fn=parse_list,
-                temperature=self.temperature
+        # data_content 在各章节间不变，只序列化一次
+        data_content_json = json_dumps(data_content)
+        
+        # 第一章单独生成，之后的章节按批并发生成，每批以之前已完成的页面作为上下文
+        progress = tqdm(total=len(chapters))
+        executor = self._get_chapter_executor()
+        start = 0
+        while start < len(chapters):
+            stop = min(start + (1 if start == 0 else max_concurrent), len(chapters))
+            generate_fn = partial(
+                self.generate_chapter_pages,
+                data_content_json=data_content_json,
+                completed_json=json_dumps(all_pages)
             )
-            
-            # 如果生成失败，重试几次
-            retry_count = 0
-            while not success and retry_count < 3:
-                chapter_detail, success = chapter_writer.call(
-                    json.dumps(
-                        {
-                            "data_content": data_content,
-                            "current_chapter": chapter,
-                            "completed_story": all_pages
-                        },
-                        ensure_ascii=False
-                    ),
-                    seed=random.randint(0, 100000),
-                    temperature=self.temperature,
-                    success_check_fn=parse_list
-                )
-                retry_count += 1
-            
-            if success:
-                try:
-                    pages = eval(chapter_detail)
-                    if isinstance(pages, list):
-                        pages = [page.strip() for page in pages]
-                        all_pages.extend(pages)
-                    else:
-                        # 如果返回的不是列表，创建默认页面
-                        all_pages.append(f"第{idx+1}章: {chapter['chapter_title']}")
-                except:
-                    # 如果解析失败，创建默认页面
-                    all_pages.append(f"第{idx+1}章: {chapter['chapter_title']}")
-            else:
-                # 如果所有重试都失败，创建默认页面
-                all_pages.append(f"第{idx+1}章: {chapter['chapter_title']}")
-                all_pages.append(f"基于数据的分析内容")
+            for pages in executor.map(generate_fn, range(start, stop), chapters[start:stop]):
+                all_pages.extend(pages)
+                progress.update(1)
+            start = stop
+        progress.close()
         
         return all_pages
 
     def call(self, params):
         """主调用函数，现在接受数据内容作为输入"""
-        # 检查参数类型，支持字符串或字典格式的数据
-        if isinstance(params, dict):
-            # 如果是字典，检查是否有文件路径
-            if "file_path" in params:
-                # 从文件读取数据
-                try:
-                    with open(params["file_path"], 'r', encoding='utf-8') as f:
-                        data_content = f.read()
-                except Exception as e:
-                    print(f"读取文件失败: {e}")
-                    return ["文件读取失败，请检查文件路径"]
-            else:
-                # 从data_content字段获取数据
-                data_content = params.get("data_content", str(params))
-        else:
-            # 如果是字符串，检查是否是文件路径
-            if os.path.exists(params) and os.path.isfile(params):
-                try:
-                    with open(params, 'r', encoding='utf-8') as f:
-                        data_content = f.read()
-                except Exception as e:
-                    print(f"读取文件失败: {e}")
-                    return ["文件读取失败，请检查文件路径"]
-            else:
-                # 直接使用字符串作为数据内容
-                data_content = str(params)
+        # 支持字典（file_path / data_content）、文件路径或直接传入数据内容
+        try:
+            data_content = load_data_content(params)
+        except Exception as e:
+            print(f"读取文件失败: {e}")
+            return ["文件读取失败，请检查文件路径"]
         
         # 生成故事大纲
         outline = self.generate_outline(data_content)
@@ -240,54 +258,36 @@ class DataDrivenStoryWriter:
         self.cfg = cfg
         self.temperature = cfg.get("temperature", 1.0)
         self.llm_type = cfg.get("llm", "qwen")
+        self.story_writer = None
         
         # 直接生成故事的prompt
         self.direct_story_system = """你是一个专业的数据故事作家。请根据提供的数据内容直接生成一个连贯的故事。
         故事应该分为多个页面，每个页面包含一个完整的思想或数据点。
         确保故事内容真实反映数据，避免虚构和主观臆测。
-        输出格式必须是一个Python列表，每个元素是一个字符串，表示一个故事页面。"""
+        输出格式必须是一个JSON数组，每个元素是一个字符串，表示一个故事页面。"""
 
     def call(self, params):
         """直接根据数据生成故事页面，支持文件输入"""
-        # 检查参数类型，支持字符串或字典格式的数据
-        if isinstance(params, dict):
-            # 如果是字典，检查是否有文件路径
-            if "file_path" in params:
-                # 从文件读取数据
-                try:
-                    with open(params["file_path"], 'r', encoding='utf-8') as f:
-                        data_content = f.read()
-                except Exception as e:
-                    print(f"读取文件失败: {e}")
-                    return ["文件读取失败，请检查文件路径"]
-            else:
-                # 从data_content字段获取数据
-                data_content = params.get("data_content", str(params))
-        else:
-            # 如果是字符串，检查是否是文件路径
-            if os.path.exists(params) and os.path.isfile(params):
-                try:
-                    with open(params, 'r', encoding='utf-8') as f:
-                        data_content = f.read()
-                except Exception as e:
-                    print(f"读取文件失败: {e}")
-                    return ["文件读取失败，请检查文件路径"]
-            else:
-                # 直接使用字符串作为数据内容
-                data_content = str(params)
+        # 支持字典（file_path / data_content）、文件路径或直接传入数据内容
+        try:
+            data_content = load_data_content(params)
+        except Exception as e:
+            print(f"读取文件失败: {e}")
+            return ["文件读取失败，请检查文件路径"]
         
         # 如果数据内容为空，使用默认数据
         if not data_content.strip():
             data_content = "暂无数据内容，请提供具体的数据信息"
         
         # 生成故事
-        story_writer = init_tool_instance({
-            "tool": self.llm_type,
-            "cfg": {
-                "system_prompt": self.direct_story_system,
-                "track_history": False
-            }
-        })
+        if self.story_writer is None:
+            self.story_writer = init_tool_instance({
+                "tool": self.llm_type,
+                "cfg": {
+                    "system_prompt": self.direct_story_system,
+                    "track_history": False
+                }
+            })
         
         story_prompt = f"""请基于以下数据内容直接生成一个连贯的故事，分为多个页面：
 
@@ -301,13 +301,17 @@ class DataDrivenStoryWriter:
 4. 避免主观臆测
 
 不要生成超过8个页面。
-返回一个Python列表格式的故事页面。"""
+返回一个JSON数组格式的故事页面，每个元素是一个字符串。"""
         
-        pages, success = story_writer.call(story_prompt, success_check_fn=parse_list)
+        pages, success = self.story_writer.call(story_prompt, success_check_fn=parse_list)
         
         if success:
             try:
-                pages = eval(pages)
+                try:
+                    pages = json_loads(pages)
+                except ValueError:
+                    # 兼容模型仍按Python列表格式输出的情况
+                    pages = ast.literal_eval(pages)
                 if isinstance(pages, list):
                     return [page.strip() for page in pages]
             except:
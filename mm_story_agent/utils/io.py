@@ -0,0 +1,49 @@
+import os
+import mmap
+import stat
+from functools import lru_cache
+from pathlib import Path
+
+# 超过该大小的文件通过只读 mmap 直接解码
+MMAP_THRESHOLD = 1 << 20
+
+
+def may_be_file_path(params):
+    # 过长或多行的字符串显然是数据内容而不是路径，无需探测文件系统
+    return isinstance(params, str) and len(params) < 4096 and "\n" not in params[:256]
+
+
+@lru_cache(maxsize=8)
+def _read_data_file(path: str, mtime_ns: int, size: int) -> str:
+    # mtime_ns 和 size 作为缓存键的一部分，文件被修改后会重新读取
+    if size <= MMAP_THRESHOLD:
+        return Path(path).read_text(encoding="utf-8")
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        # 与文本模式读取保持一致，统一换行符
+        return str(mm, "utf-8").replace("\r\n", "\n").replace("\r", "\n")
+
+
+def read_data_file(path) -> str:
+    """读取 UTF-8 数据文件，文件未变化时复用缓存的内容"""
+    st = os.stat(path)
+    return _read_data_file(os.fspath(path), st.st_mtime_ns, st.st_size)
+
+
+def load_data_content(params) -> str:
+    """将故事生成器的参数解析为数据内容字符串
+
+    params 可以是包含 file_path 或 data_content 的字典、数据文件路径，或直接是数据内容；
+    显式指定的文件无法读取时抛出 OSError / UnicodeDecodeError
+    """
+    if isinstance(params, dict):
+        if "file_path" in params:
+            return read_data_file(params["file_path"])
+        return params.get("data_content", str(params))
+    if may_be_file_path(params):
+        try:
+            st = os.stat(params)
+        except (OSError, ValueError):
+            st = None
+        if st is not None and stat.S_ISREG(st.st_mode):
+            return _read_data_file(params, st.st_mtime_ns, st.st_size)
+    return str(params)
@@ -0,0 +1,31 @@
+import json
+
+# orjson 为可选依赖，未安装时退回标准库 json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_dumps_bytes(obj, indent: bool = False) -> bytes:
+    """将 obj 序列化为 UTF-8 编码的 JSON 字节串，安装了 orjson 时优先使用"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, option=option)
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def json_dumps(obj) -> str:
+    """将 obj 序列化为紧凑的 JSON 字符串，中文等非 ASCII 字符不转义"""
+    return json_dumps_bytes(obj).decode("utf-8")
+
+
+def json_loads(data):
+    """从 str 或 bytes 解析 JSON，格式错误时抛出 ValueError"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
@@ -0,0 +1,7 @@
+import random
+import time
+
+
+def backoff_sleep(attempt: int, base: float = 0.2, jitter: float = 0.1):
+    """重试前指数退避：等待 base * 2 ** attempt 秒，并加上随机抖动"""
+    time.sleep(base * 2 ** attempt + random.random() * jitter)
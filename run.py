@@ -13,5 +13,5 @@ if __name__ == "__main__":
     with open(args.config, "r", encoding='utf-8') as reader:
         config = yaml.load(reader, Loader=yaml.FullLoader)
     
-    mm_story_agent = MMStoryAgent()
-    mm_story_agent.call(config)
+    with MMStoryAgent() as mm_story_agent:
+        mm_story_agent.call(config)